@@ -1,108 +1,304 @@
+import hashlib
 import os
+import re
 import shutil
 import sys
-from node import markdown_to_html_node, extract_title
+from collections import deque
+from itertools import repeat
+from node import Writer, markdown_to_html_node, extract_title
+
+# Matches the title placeholder and the root relative links in the template that need to point at the basepath
+TEMPLATE_TOKEN_RE = re.compile(r'\{\{ Title \}\}|href="/|src="/')
+# Matches the root relative links in the generated html
+BASEPATH_LINK_RE = re.compile(r'href="/|src="/')
+
+
+# Wraps an output file so that the root relative links in everything written through it point at the basepath.
+# HTMLNode.write_to writes whole tags and whole pieces of text at a time so a link is never split between two writes.
+class BasepathWriter:
+    def __init__(self, output: Writer, basepath: str):
+        self.output: Writer = output
+        self.link_substitutions: dict[str, str] = {
+            'href="/': f'href="{basepath}',
+            'src="/': f'src="{basepath}',
+        }
+
+    def write(self, text: str) -> object:
+        return self.output.write(
+            BASEPATH_LINK_RE.sub(
+                lambda match: self.link_substitutions[match.group(0)], text
+            )
+        )
 
 
 # The base case for the generate_pages_recursive function.
 # Get the html from the markdown file. Fills in the template with the html and the title.
+# The template is passed in already read so it isn't re-read for every page.
+# The html tree is streamed straight into the output file between the parts of the template around {{ Content }}
+# so the whole page is never held in memory as one string.
 def generate_page(
-    from_path: str, template_path: str, dest_path: str, basepath: str
+    from_path: str, template_file: str, dest_path: str, basepath: str
 ) -> None:
     if not os.path.exists(from_path):
         raise ValueError("No file at that location")
-    if not os.path.exists(template_path):
-        raise ValueError("No template at that location")
 
-    print(f"Generating page {from_path} to {dest_path} using {template_path}")
+    print(f"Generating page {from_path} to {dest_path}")
     with open(from_path) as m_file:
         markdown_file = m_file.read()
-    with open(template_path) as html_template:
-        template_file = html_template.read()
 
     html_tree = markdown_to_html_node(markdown_file)
-    html_string = html_tree.to_html()
 
+    # Only the template is scanned for the title and links, which is small. Each replacement is made in a single pass.
+    # With the default basepath the links already point at the right place so only the title is filled in.
     title = extract_title(markdown_file)
-    filled_in_template = template_file.replace("{{ Title }}", title)
-    filled_in_template = filled_in_template.replace("{{ Content }}", html_string)
-    filled_in_template = filled_in_template.replace('href="/', 'href="' + basepath)
-    filled_in_template = filled_in_template.replace('src="/', 'src="' + basepath)
-    with open(dest_path, "w") as output:
-        _ = output.write(filled_in_template)
+    template_parts = template_file.split("{{ Content }}")
+    if basepath == "/":
+        template_parts = [part.replace("{{ Title }}", title) for part in template_parts]
+    else:
+        substitutions = {
+            "{{ Title }}": title,
+            'href="/': f'href="{basepath}',
+            'src="/': f'src="{basepath}',
+        }
+        template_parts = [
+            TEMPLATE_TOKEN_RE.sub(lambda match: substitutions[match.group(0)], part)
+            for part in template_parts
+        ]
+    # newline="" writes the text as is without translating newlines
+    with open(dest_path, "w", encoding="utf-8", newline="", buffering=65536) as output:
+        content_output: Writer = output
+        if basepath != "/":
+            content_output = BasepathWriter(output, basepath)
+        _ = output.write(template_parts[0])
+        for template_part in template_parts[1:]:
+            html_tree.write_to(content_output)
+            _ = output.write(template_part)
 
     return None
 
 
-# Generates HTML files in the given destination directory from the markdown files in the content directory.
-# The function searches through directories and if a markdown file is found it creates a new page.
-# If a directory is found it'll search through that directory as well.
+# Pages are only generated in parallel when there are more than this many of them.
+# Generating one of the site's pages takes about 0.25 ms while starting the process pool takes about 30 ms,
+# so even with four cpus the pool only pays for itself at around 160 pages.
+PARALLEL_PAGE_THRESHOLD = 200
+
+
+# Searches through the content directory and its sub directories for markdown files.
+# Returns a list of (markdown path, html path) pairs, one for every page that needs to be generated.
+# The matching directories are created in the destination directory so the pages can be written in any order.
+# Directories still to be searched are kept on a stack instead of recursing, and os.scandir is used so
+# checking whether an entry is a file reuses what was read from the directory instead of another stat call.
 # If another file type is found it is ignored.
-def generate_pages_recursive(
-    dir_path_content: str, template_path: str, dest_dir_path: str, basepath: str
-) -> None:
+def collect_pages(dir_path_content: str, dest_dir_path: str) -> list[tuple[str, str]]:
     if not os.path.exists(dir_path_content):
         raise ValueError("No Content on this path")
+    pages: list[tuple[str, str]] = []
+    dirs_to_search = deque([(dir_path_content, dest_dir_path)])
+    while dirs_to_search:
+        content_dir_path, page_dir_path = dirs_to_search.pop()
+        os.makedirs(page_dir_path, exist_ok=True)
+        with os.scandir(content_dir_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    if entry.name.endswith(".md"):
+                        pages.append(
+                            (
+                                entry.path,
+                                f"{os.path.join(page_dir_path, entry.name[:-3])}.html",
+                            )
+                        )
+                else:
+                    dirs_to_search.append(
+                        (entry.path, os.path.join(page_dir_path, entry.name))
+                    )
+    return pages
+
+
+# The files whose code decides what a page looks like. They're part of the page cache key so that changing
+# the generator doesn't leave old pages in the cache.
+GENERATOR_SOURCE_PATHS = (__file__, os.path.join(os.path.dirname(__file__), "node.py"))
+
+
+# Copies every page that is already in the page cache straight to its destination instead of generating it.
+# A page's cache key is a hash of its markdown, the template and the generator's source code.
+# Each basepath has its own subdirectory of the cache so builds for different basepaths don't evict each other.
+# Returns the pages that still need to be generated along with the cache path each one should be saved to.
+# Any other page in the basepath's directory wasn't produced by this build, so it's removed to stop the cache
+# growing forever. Temporary files are left alone since they belong to pages that are still being saved.
+def copy_cached_pages(
+    pages: list[tuple[str, str]], cache_dir: str, template_file: str, basepath: str
+) -> tuple[list[tuple[str, str]], list[str]]:
+    basepath_hash = hashlib.blake2b(basepath.encode(), digest_size=8).hexdigest()
+    cache_dir = os.path.join(cache_dir, basepath_hash)
+    os.makedirs(cache_dir, exist_ok=True)
+    # everything except the markdown is the same for every page so it's only hashed once
+    build_hash = hashlib.blake2b(digest_size=16)
+    for source_path in GENERATOR_SOURCE_PATHS:
+        with open(source_path, "rb") as source_file:
+            build_hash.update(source_file.read())
+    build_hash.update(b"\0" + template_file.encode())
+
+    uncached_pages: list[tuple[str, str]] = []
+    cache_paths: list[str] = []
+    cache_names: set[str] = set()
+    for from_path, dest_path in pages:
+        page_hash = build_hash.copy()
+        with open(from_path, "rb") as m_file:
+            page_hash.update(b"\0" + m_file.read())
+        cache_name = f"{page_hash.hexdigest()}.html"
+        cache_names.add(cache_name)
+        cache_path = os.path.join(cache_dir, cache_name)
+        if os.path.exists(cache_path):
+            print(f"Copying cached page {from_path} to {dest_path}")
+            _ = shutil.copyfile(cache_path, dest_path)
+        else:
+            uncached_pages.append((from_path, dest_path))
+            cache_paths.append(cache_path)
+
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if (
+                entry.name not in cache_names
+                and not entry.name.endswith(".tmp")
+                and entry.is_file()
+            ):
+                os.remove(entry.path)
+    return uncached_pages, cache_paths
+
+
+# Saves a generated page to the page cache.
+# The page is copied to a temporary file in the cache directory first and then renamed over the cache path,
+# so a build that's interrupted part way through never leaves a half written page in the cache.
+def save_cached_page(dest_path: str, cache_path: str) -> None:
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
     try:
-        os.mkdir(dest_dir_path)
-    except FileExistsError:
-        pass
-    dir_content = os.listdir(dir_path_content)
-    for content in dir_content:
-        content_path = os.path.join(dir_path_content, content)
-        if os.path.isfile(content_path):
-            if content_path[-3:] == ".md":
-                generate_page(
-                    content_path,
-                    template_path,
-                    f"{os.path.join(dest_dir_path, content[:-3])}.html",
-                    basepath,
+        _ = shutil.copyfile(dest_path, temp_path)
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return None
+
+
+# Generates HTML files in the given destination directory from the markdown files in the content directory.
+# The template is read once up front and shared by every page.
+# If a cache directory is given, pages that haven't changed since they were cached are copied from it and
+# newly generated pages are saved to it.
+# Every page is independent of the others so once they've all been found they are generated across a process pool.
+def generate_pages_recursive(
+    dir_path_content: str,
+    template_path: str,
+    dest_dir_path: str,
+    basepath: str,
+    cache_dir: str | None = None,
+) -> None:
+    if not os.path.exists(template_path):
+        raise ValueError("No template at that location")
+    with open(template_path) as html_template:
+        template_file = html_template.read()
+
+    pages = collect_pages(dir_path_content, dest_dir_path)
+    cache_paths: list[str] = []
+    if cache_dir is not None:
+        pages, cache_paths = copy_cached_pages(
+            pages, cache_dir, template_file, basepath
+        )
+
+    # with a single cpu a process pool would only add the cost of starting it
+    workers = min(os.cpu_count() or 1, len(pages))
+    if len(pages) <= PARALLEL_PAGE_THRESHOLD or workers == 1:
+        for from_path, dest_path in pages:
+            generate_page(from_path, template_file, dest_path, basepath)
+    else:
+        from_paths = [from_path for from_path, _ in pages]
+        dest_paths = [dest_path for _, dest_path in pages]
+        # the process pool pulls in multiprocessing, so it's only imported when it's used
+        from concurrent.futures import ProcessPoolExecutor
+
+        # a few chunks per worker keeps the workers busy without sending every page on its own
+        chunksize = max(1, len(pages) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # the results are consumed so that an exception in a worker is raised here
+            _ = list(
+                executor.map(
+                    generate_page,
+                    from_paths,
+                    repeat(template_file),
+                    dest_paths,
+                    repeat(basepath),
+                    chunksize=chunksize,
                 )
-            else:
-                continue
-        else:
-            generate_pages_recursive(
-                f"{content_path}/",
-                template_path,
-                f"{os.path.join(dest_dir_path, content)}",
-                basepath,
             )
 
+    # cache_paths is empty when there's no cache directory
+    for (_, dest_path), cache_path in zip(pages, cache_paths):
+        save_cached_page(dest_path, cache_path)
+
     return None
 
 
-# Recurisvely copys all of the files from one directory into another.
+# Static files are only copied in parallel when there are more than this many of them.
+PARALLEL_COPY_THRESHOLD = 16
+
+
+# Copys all of the files from one directory and its sub directories into another.
+# Like collect_pages it walks the directories with a stack and os.scandir instead of recursing.
+# All of the directories are made first and then the files are copied across a thread pool. Copying is
+# mostly waiting on the file system, which releases the GIL, so the copies overlap.
+# A handful of files are copied one after the other since starting the pool would take longer than copying them.
 def copy_directory(origin: str, destiniation: str) -> None:
     if not os.path.exists(origin):
         raise ValueError("Origin does not exist")
     # delete contents of a destiniation if it already exists for a clean copy
     if os.path.exists(destiniation):
         shutil.rmtree(destiniation)
-    os.mkdir(destiniation)
-    origin_contents = os.listdir(origin)
-    for content in origin_contents:
-        content_path = os.path.join(origin, content)
-        if os.path.isfile(content_path):
-            _ = shutil.copy(content_path, destiniation)
-        else:
-            copy_directory(
-                f"{content_path}/", f"{os.path.join(destiniation, content)}/"
-            )
+    origin_paths: list[str] = []
+    destiniation_paths: list[str] = []
+    dirs_to_copy = deque([(origin, destiniation)])
+    while dirs_to_copy:
+        origin_dir_path, destiniation_dir_path = dirs_to_copy.pop()
+        os.mkdir(destiniation_dir_path)
+        with os.scandir(origin_dir_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    origin_paths.append(entry.path)
+                    destiniation_paths.append(
+                        os.path.join(destiniation_dir_path, entry.name)
+                    )
+                else:
+                    dirs_to_copy.append(
+                        (entry.path, os.path.join(destiniation_dir_path, entry.name))
+                    )
+
+    # copyfile skips the permission copying that shutil.copy does
+    if len(origin_paths) <= PARALLEL_COPY_THRESHOLD:
+        for origin_path, destiniation_path in zip(origin_paths, destiniation_paths):
+            _ = shutil.copyfile(origin_path, destiniation_path)
+        return None
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        _ = list(executor.map(shutil.copyfile, origin_paths, destiniation_paths))
+    return None
 
 
 # Gets the basepath from the command line and sets a default if there isn't one.
 # Copys the static content into the docs directory.
 # Generates html files from the content directory using the given html template into the docs directory
+# Pages are cached in .cache/html so rebuilding only regenerates the pages that changed
 def main():
-    base_path = "/"
-    if len(sys.argv) > 1:
-        base_path = sys.argv[1]
+    base_path = sys.argv[1] if len(sys.argv) > 1 else "/"
     copy_directory(
         "./static/",
         "./docs/",
     )
-    generate_pages_recursive("./content/", "./template.html", "./docs/", base_path)
+    generate_pages_recursive(
+        "./content/", "./template.html", "./docs/", base_path, "./.cache/html/"
+    )
 
 
-# Calls the main function
-main()
+# Calls the main function. The guard stops the worker processes from running it again when they import this module.
+if __name__ == "__main__":
+    main()
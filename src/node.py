@@ -1,15 +1,55 @@
-from typing import override
-from enum import Enum
+import re
+import sys
+from functools import lru_cache
+from collections.abc import Callable, Iterator
+from typing import Protocol, override
+from enum import IntEnum
 
 # =================== HTMLNode Section =========================
 
 
+# The tags used when converting markdown, interned so every node with the same tag shares one string.
+# Comparing or hashing an interned tag is then just a pointer check. This matters most for the heading tags
+# which are built with an f-string for every heading.
+_TAGS = {
+    tag: sys.intern(tag)
+    for tag in "p div span b i code a img ul ol li h1 h2 h3 h4 h5 h6 pre blockquote".split()
+}
+
+
+# A translation table that escapes the characters that aren't safe inside an html attribute value.
+# str.translate makes one pass over the value instead of one pass per character with str.replace.
+_PROP_ESCAPE = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}
+)
+
+
+# Anything that html can be written to with a write method, like an open text file
+class Writer(Protocol):
+    def write(self, text: str, /) -> object: ...
+
+
+# Works out the html for a node's attributes.
+# The values are escaped so quotes or other html characters in them can't break out of the attribute
+def _props_to_html(props: dict[str, str] | None) -> str:
+    if props is None:
+        return ""
+    return "".join(
+        f' {key}="{value.translate(_PROP_ESCAPE)}"' for key, value in props.items()
+    )
+
+
 # A node of in an HTML tree. This can be either block level or inline Html
 # tag: str : the html tag name
 # value: str : the text inside this Html node
 # children: list[HTMLNode] : The children of this Html node
 # props: dict[str, str]: key-value pairs representing the attributes of the HTML tag of this node
 class HTMLNode:
+    # Nodes are created by the thousand so they use slots instead of a per instance __dict__
+    # props is kept in a private slot behind a read only property since its html is worked out in __init__
+    # and would go stale if it was reassigned.
+    __slots__ = ("tag", "value", "children", "_props", "_props_html")
+
     def __init__(
         self,
         tag: str | None = None,
@@ -17,24 +57,36 @@ class HTMLNode:
         children: list["HTMLNode"] | None = None,
         props: dict[str, str] | None = None,
     ):
-        self.tag: str | None = tag
+        self.tag: str | None = _TAGS.get(tag, tag) if tag is not None else None
         self.value: str | None = value
         self.children: list[HTMLNode] | None = children
-        self.props: dict[str, str] | None = props
+        self._props: dict[str, str] | None = props
+        # props are set once here so their html is worked out once instead of on every render
+        self._props_html: str = _props_to_html(props)
+
+    @property
+    def props(self) -> dict[str, str] | None:
+        return self._props
 
     # This function is meant to be implemented by child classes
     def to_html(self) -> str:
         raise NotImplementedError
 
+    # Writes this node's html to the output piece by piece instead of building it as one string.
+    # This function is meant to be implemented by child classes
+    def write_to(self, out: Writer) -> None:
+        raise NotImplementedError
+
+    # Appends the pieces of this node's html to buf instead of returning a string.
+    # A caller rendering many documents can pass the same list every time and clear it in between.
+    # This function is meant to be implemented by child classes
+    def _to_html_into(self, buf: list[str]) -> None:
+        raise NotImplementedError
+
     # outputs a string representation of this node's attributes as a single line string where the {key} = {value}
+    # The string is built when the node is made, see __init__
     def props_to_html(self) -> str:
-        result = ""
-        if self.props is not None:
-            for key in self.props.keys():
-                result += f' {key}="{self.props[key]}"'
-            return result
-        else:
-            return ""
+        return self._props_html
 
     # This class's string representation is just all of its feilds one after the other
     @override
@@ -49,20 +101,53 @@ class HTMLNode:
 
 # An HTML node with no children
 class LeafNode(HTMLNode):
+    # A leaf's whole html is built when it's made and leaves are shared by _make_leaf, so its tag and value
+    # are also kept in private slots behind read only properties.
+    __slots__ = ("_tag", "_value", "_html")
+
+    # A leaf's html only depends on the tag, value and props it's made with so it's built once here.
+    # The value is required so a leaf without one is rejected straight away.
     def __init__(
         self, tag: str | None, value: str | None, props: dict[str, str] | None = None
     ):
-        super().__init__(tag, value, None, props)
+        if value is None:
+            raise ValueError("No value")
+        self._tag: str | None = _TAGS.get(tag, tag) if tag is not None else None
+        self._value: str = value
+        self.children = None
+        self._props = props
+        self._props_html = _props_to_html(props)
+        if tag is None:
+            self._html: str = value
+        else:
+            self._html = f"<{tag}{self._props_html}>{value}</{tag}>"
+
+    @property
+    @override
+    def tag(self) -> str | None:  # pyright: ignore[reportIncompatibleVariableOverride]
+        return self._tag
+
+    @property
+    @override
+    def value(
+        self,
+    ) -> str | None:  # pyright: ignore[reportIncompatibleVariableOverride]
+        return self._value
 
     # Converts this node to an HTML string. Surrounds the value with the tags of this node. If there is no tag it just returns the plain text of value.
+    # The string was built when the node was made, see __init__
     @override
     def to_html(self) -> str:
-        if self.value is None:
-            raise ValueError
-        elif self.tag is None:
-            return self.value
-        else:
-            return f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
+        return self._html
+
+    # A leaf is small so it's written as a single piece
+    @override
+    def write_to(self, out: Writer) -> None:
+        _ = out.write(self._html)
+
+    @override
+    def _to_html_into(self, buf: list[str]) -> None:
+        buf.append(self._html)
 
     @override
     def __repr__(self):
@@ -71,6 +156,8 @@ class LeafNode(HTMLNode):
 
 # an HTML node that must have children
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(
         self,
         tag: str | None,
@@ -80,65 +167,96 @@ class ParentNode(HTMLNode):
         super().__init__(tag, None, children, props)
 
     # The main point of this class is this function. It formats all of the children's html into an output string
+    # The pieces are collected in a list and joined once so building a large document stays linear.
     @override
     def to_html(self) -> str:
-        if self.tag is None:
-            raise ValueError("No tag")
-        elif self.children is None:
-            raise ValueError("No children")
-        else:
-            result = f"<{self.tag}{self.props_to_html()}>"
-            for child in self.children:
-                result += child.to_html()
-            return result + f"</{self.tag}>"
+        buf: list[str] = []
+        self._to_html_into(buf)
+        return "".join(buf)
+
+    @override
+    def _to_html_into(self, buf: list[str]) -> None:
+        self._emit_html(buf.append)
+
+    # Writes the html to the output one tag or leaf at a time.
+    # Only one node's html is held at a time instead of the whole document.
+    @override
+    def write_to(self, out: Writer) -> None:
+        self._emit_html(out.write)
+
+    # Walks this node's tree in document order and passes each piece of html to emit.
+    # The walk uses a stack instead of recursion. Each parent pushes its closing tag and then its children in
+    # reverse so they come off the stack in order, followed by the closing tag.
+    def _emit_html(self, emit: Callable[[str], object]) -> None:
+        stack: list[HTMLNode | str] = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                _ = emit(node)
+            elif isinstance(node, ParentNode):
+                if node.tag is None:
+                    raise ValueError("No tag")
+                elif node.children is None:
+                    raise ValueError("No children")
+                _ = emit(f"<{node.tag}{node._props_html}>")
+                stack.append(f"</{node.tag}>")
+                stack.extend(reversed(node.children))
+            else:
+                _ = emit(node.to_html())
 
 
 # ================ TextNode Section ======================
 
 
 # An enum to represent the type of text stored in a TextNode
-class TextType(Enum):
-    TEXT = "text"
-    BOLD_TEXT = "bold"
-    ITALIC_TEXT = "italic"
-    CODE_TEXT = "code"
-    LINK_TEXT = "link"
-    IMAGE_TEXT = "image"
+# It's an IntEnum so the comparisons in the parser are plain int comparisons
+class TextType(IntEnum):
+    TEXT = 0
+    BOLD_TEXT = 1
+    ITALIC_TEXT = 2
+    CODE_TEXT = 3
+    LINK_TEXT = 4
+    IMAGE_TEXT = 5
 
 
 # An intermediate node containing some inline text with its text type. If it's a link or image it's url link is stored
 class TextNode:
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text: str, text_type: TextType, url: str | None = None):
         self.text: str = text
         self.text_type: TextType = text_type
         self.url: str | None = url
 
     # Two text nodes are equal if all of their fields are equal. This is mainly used for testing.
+    # The text type and url are compared first since they're cheap, so the text, which can be long, is only
+    # compared when everything else already matches.
     @override
     def __eq__(self, other: object) -> bool:
         if isinstance(other, TextNode):
             return (
-                self.text == other.text
-                and self.text_type == other.text_type
+                self.text_type == other.text_type
                 and self.url == other.url
+                and self.text == other.text
             )
         return False
 
     # The string representation of a node is just it's text then text type and then url if there is one.
     @override
     def __repr__(self):
-        return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
+        return f"TextNode({self.text}, {self.text_type.name.lower()}, {self.url})"
 
 
 # =============== Block_type ===================
 # An enum to represent the type of a text block. This is used for grouping markdown text
-class Block_Type(Enum):
-    HEADING = "heading"
-    CODE = "code"
-    QUOTE = "quote"
-    ULIST = "unordered_list"
-    OLIST = "ordered_list"
-    PARAGRAPH = "paragraph"
+# Like TextType it's an IntEnum so comparing block types is a plain int comparison
+class Block_Type(IntEnum):
+    HEADING = 0
+    CODE = 1
+    QUOTE = 2
+    ULIST = 3
+    OLIST = 4
+    PARAGRAPH = 5
 
 
 # ================== Text_Node Helper functions ===================
@@ -146,23 +264,48 @@ class Block_Type(Enum):
 
 # Returns a LeafNode based on the text type with the appropriate HTML tag. If it's a link or image save the link in the leaf node.
 def text_node_to_html_node(text_node: TextNode) -> LeafNode:
-    if text_node.text_type == TextType.TEXT:
-        return LeafNode(None, text_node.text, None)
-    elif text_node.text_type == TextType.BOLD_TEXT:
-        return LeafNode("b", text_node.text, None)
-    elif text_node.text_type == TextType.ITALIC_TEXT:
-        return LeafNode("i", text_node.text, None)
-    elif text_node.text_type == TextType.CODE_TEXT:
-        return LeafNode("code", text_node.text, None)
-    elif text_node.text_type == TextType.LINK_TEXT:
-        return LeafNode("a", text_node.text, {"href": text_node.url})
-    elif text_node.text_type == TextType.IMAGE_TEXT:
-        return LeafNode("img", "", {"src": text_node.url, "alt": text_node.text})
-    else:
-        raise ValueError(f"invalid text type: {text_node.text_type}")
+    return _make_leaf(text_node.text, text_node.text_type, text_node.url)
+
+
+# Links and images need a url to put in their attribute, so a text node of either type without one is rejected.
+def _link_leaf(text: str, url: str | None) -> LeafNode:
+    if url is None:
+        raise ValueError("No url for link")
+    return LeafNode("a", text, {"href": url})
+
+
+def _image_leaf(text: str, url: str | None) -> LeafNode:
+    if url is None:
+        raise ValueError("No url for image")
+    return LeafNode("img", "", {"src": url, "alt": text})
+
+
+# Builds the LeafNode for each text type from the node's text and url.
+# TextType is an IntEnum numbered from 0 so the builders are in the same order and looked up by index.
+_LEAF_BUILDERS: tuple[Callable[[str, str | None], LeafNode], ...] = (
+    lambda text, url: LeafNode(None, text, None),  # TEXT
+    lambda text, url: LeafNode("b", text, None),  # BOLD_TEXT
+    lambda text, url: LeafNode("i", text, None),  # ITALIC_TEXT
+    lambda text, url: LeafNode("code", text, None),  # CODE_TEXT
+    _link_leaf,  # LINK_TEXT
+    _image_leaf,  # IMAGE_TEXT
+)
+
+
+# Builds the LeafNode for text_node_to_html_node. Leaf nodes aren't changed once they're built so the same node
+# can be shared between every identical piece of text, which saves rebuilding it for repeated fragments.
+# The builder is found by indexing with the text type instead of going through a chain of comparisons.
+# The cache is typed because an IntEnum member equals any int with the same value, like Block_Type.HEADING and
+# TextType.TEXT, and a cache hit would skip the text type check.
+@lru_cache(maxsize=4096, typed=True)
+def _make_leaf(text: str, text_type: TextType, url: str | None) -> LeafNode:
+    if not isinstance(text_type, TextType):
+        raise ValueError(f"invalid text type: {text_type}")
+    return _LEAF_BUILDERS[text_type](text, url)
 
 
 # Takes a list of TextNodes and returns a new list that parses out the given text type on the given delimiter. It keeps the text in order.
+# An unclosed delimiter raises a ValueError here, while text_to_textnodes leaves it as plain text.
 def split_nodes_delimiter(
     old_nodes: list[TextNode], delimiter: str, text_type: TextType
 ) -> list[TextNode]:
@@ -188,238 +331,275 @@ def split_nodes_delimiter(
     return resulting_nodes
 
 
-# Extracts links and images out of plain text nodes and returns a new list of of TextNodes
-# The logic for this one is a little complicated but basically it just loops character by character looking for the image or link delimiter
-# and then extracts the link and it's associated text.
-# I could have used the regex library but it was easier for me to do it manually and it's more efficient.
+# Match a markdown image or link with the text in group 1 and the url in group 2.
+# A link is only matched when its [ isn't preceded by the ! that marks an image.
+_IMAGE_RE = re.compile(r"!\[([^\]]*)\]\(([^)]*)\)")
+_LINK_RE = re.compile(r"(?<!!)\[([^\]]*)\]\(([^)]*)\)")
+
+
+# Extracts links or images out of plain text nodes and returns a new list of of TextNodes
+# The links are found with a regex that's compiled once when the module is loaded, picked by the text type.
+# Each text node is split on it once so the scanning happens in the regex engine instead of a python loop.
 # Preserves the order of the text.
 def split_image_or_link_nodes(
     old_nodes: list[TextNode], text_type: TextType
 ) -> list[TextNode]:
+    if text_type == TextType.IMAGE_TEXT:
+        pattern = _IMAGE_RE
+    else:
+        pattern = _LINK_RE
     new_nodes: list[TextNode] = []
-    start_delimiter = "["
     for node in old_nodes:
-        current_nodes: list[TextNode] = []
         if node.text_type != TextType.TEXT:
             new_nodes.append(node)
             continue
-        text_index = 0
-        start_index = 0
-        in_link_text = False
-        in_link_url = False
-        current_link_text = ""
-        while text_index < len(node.text):
-            if in_link_text:
-                if node.text[text_index] == "]":
-                    current_link_text = node.text[start_index:text_index]
-                    in_link_text = False
-                    in_link_url = True
-                    start_index = text_index + 2
-                    text_index += 3
-                else:
-                    text_index += 1
-            elif in_link_url:
-                if node.text[text_index] == ")":
-                    current_nodes.append(
-                        TextNode(
-                            current_link_text,
-                            text_type,
-                            node.text[start_index:text_index],
-                        )
-                    )
-                    in_link_url = False
-                    start_index = text_index + 1
-                    text_index += 1
-                else:
-                    text_index += 1
-            else:
-                if (
-                    node.text[text_index] == start_delimiter
-                    and text_type == TextType.LINK_TEXT
-                ):
-                    if start_index != text_index:
-                        current_nodes.append(
-                            TextNode(node.text[start_index:text_index], TextType.TEXT)
-                        )
-                    in_link_text = True
-                    start_index = text_index + 1
-                    text_index += 2
-                elif (
-                    node.text[text_index] == start_delimiter
-                    and text_type == TextType.IMAGE_TEXT
-                ):
-                    if node.text[text_index - 1] == "!":
-                        if text_index - start_index > 1:
-                            current_nodes.append(
-                                TextNode(
-                                    node.text[start_index : text_index - 1],
-                                    TextType.TEXT,
-                                )
-                            )
-                        in_link_text = True
-                        start_index = text_index + 1
-                        text_index += 2
-                    else:
-                        text_index += 1
-                else:
-                    text_index += 1
-        if text_index - start_index > 0:
-            current_nodes.append(
-                TextNode(node.text[start_index:text_index], TextType.TEXT)
-            )
-        if in_link_text or in_link_url:
-            print(node)
-            raise ValueError("invalid markdown")
-        new_nodes.extend(current_nodes)
+        # splitting on a pattern with two groups gives [text, alt, url, text, alt, url, ..., text]
+        parts = pattern.split(node.text)
+        for i in range(0, len(parts) - 1, 3):
+            if parts[i]:
+                new_nodes.append(TextNode(parts[i], TextType.TEXT))
+            new_nodes.append(TextNode(parts[i + 1], text_type, parts[i + 2]))
+        if parts[-1]:
+            new_nodes.append(TextNode(parts[-1], TextType.TEXT))
 
     return new_nodes
 
 
-# This function combines the two splitting methods to take some raw markdown text and convert it into a list of
-# textnodes with the appropriate text type.
+# Matches every kind of inline markdown at once: bold, italic, code, images and then links.
+# The number of the last group that matched tells which kind it was, see _INLINE_GROUP_TYPES.
+# A code span can't contain a backtick so it's matched with a character class rather than a lazy .+? that
+# would retry the closing backtick after every character.
+# DOTALL lets bold and italic run over a line break the same way splitting on the delimiter does.
+_INLINE_RE = re.compile(
+    r"\*\*(.+?)\*\*"
+    r"|_(.+?)_"
+    r"|`([^`]+)`"
+    r"|!\[([^\]]*)\]\(([^)]*)\)"
+    r"|\[([^\]]*)\]\(([^)]*)\)",
+    re.DOTALL,
+)
+_INLINE_GROUP_TYPES = {
+    1: TextType.BOLD_TEXT,
+    2: TextType.ITALIC_TEXT,
+    3: TextType.CODE_TEXT,
+    5: TextType.IMAGE_TEXT,
+    7: TextType.LINK_TEXT,
+}
+
+
+# Finds all of the inline markdown in some raw text and yields a (text, text type, url) tuple for each piece in order.
+# Rather than running each splitting method over the text one after the other, all of the inline syntax is
+# found in one left to right pass of _INLINE_RE. The text between matches is plain text.
+def _inline_tokens(text: str) -> Iterator[tuple[str, TextType, str | None]]:
+    last_end = 0
+    for match in _INLINE_RE.finditer(text):
+        if match.start() > last_end:
+            yield text[last_end : match.start()], TextType.TEXT, None
+        group = match.lastindex
+        text_type = _INLINE_GROUP_TYPES[group]
+        # images and links have their text in the group before the url
+        # the url is interned since the same links and images tend to appear again and again
+        if text_type == TextType.IMAGE_TEXT or text_type == TextType.LINK_TEXT:
+            yield match.group(group - 1), text_type, sys.intern(match.group(group))
+        else:
+            yield match.group(group), text_type, None
+        last_end = match.end()
+    if last_end < len(text):
+        yield text[last_end:], TextType.TEXT, None
+
+
+# Takes some raw markdown text and converts it into a list of textnodes with the appropriate text type.
+# Unlike split_nodes_delimiter an unclosed delimiter isn't an error here, it's just left in the plain text.
 def text_to_textnodes(text: str) -> list[TextNode]:
-    text_nodes: list[TextNode] = [TextNode(text, TextType.TEXT)]
-    text_nodes = split_nodes_delimiter(text_nodes, "**", TextType.BOLD_TEXT)
-    text_nodes = split_nodes_delimiter(text_nodes, "_", TextType.ITALIC_TEXT)
-    text_nodes = split_nodes_delimiter(text_nodes, "`", TextType.CODE_TEXT)
-    text_nodes = split_image_or_link_nodes(text_nodes, TextType.IMAGE_TEXT)
-    text_nodes = split_image_or_link_nodes(text_nodes, TextType.LINK_TEXT)
-    return text_nodes
+    return [
+        TextNode(token_text, text_type, url)
+        for token_text, text_type, url in _inline_tokens(text)
+    ]
+
+
+# Takes some raw markdown text and converts it straight into a list of leaf nodes.
+# This skips building TextNodes only to convert them, which is what markdown_to_html_node needs.
+def text_to_html_nodes(text: str) -> list[HTMLNode]:
+    return [
+        _make_leaf(token_text, text_type, url)
+        for token_text, text_type, url in _inline_tokens(text)
+    ]
 
 
 # ================= Block Helper Functions =======================
 
 
+_HEADING_PREFIXES = ("# ", "## ", "### ", "#### ", "##### ", "###### ")
+
+
+# A code block has at least two lines where the first and last both start with ```
+def _is_code_block(markdown_block: str) -> bool:
+    last_line_start = markdown_block.rfind("\n") + 1
+    return (
+        last_line_start > 0
+        and markdown_block.startswith("```")
+        and markdown_block.startswith("```", last_line_start)
+    )
+
+
+# Checks that every line of the block starts with the prefix.
+# It steps from the start of one line to the next with find instead of splitting the block into a list of lines.
+def _all_lines_start_with(markdown_block: str, prefix: str) -> bool:
+    line_start = 0
+    while True:
+        if not markdown_block.startswith(prefix, line_start):
+            return False
+        line_end = markdown_block.find("\n", line_start)
+        if line_end == -1:
+            return True
+        line_start = line_end + 1
+
+
+# An ordered list has every line numbered in order starting from 1
+# It steps through the lines the same way as _all_lines_start_with, counting up the expected number.
+def _is_ordered_list(markdown_block: str) -> bool:
+    line_start = 0
+    number = 1
+    while True:
+        if not markdown_block.startswith(f"{number}. ", line_start):
+            return False
+        line_end = markdown_block.find("\n", line_start)
+        if line_end == -1:
+            return True
+        line_start = line_end + 1
+        number += 1
+
+
+# Every block type other than a paragraph starts with a different character. This maps that first character to the
+# block type the block could be and the check that confirms it. The checks are plain string comparisons.
+_BLOCK_CHECKS: dict[str, tuple[Block_Type, Callable[[str], bool]]] = {
+    "#": (Block_Type.HEADING, lambda block: block.startswith(_HEADING_PREFIXES)),
+    "`": (Block_Type.CODE, _is_code_block),
+    ">": (Block_Type.QUOTE, lambda block: _all_lines_start_with(block, ">")),
+    "-": (Block_Type.ULIST, lambda block: _all_lines_start_with(block, "- ")),
+    "1": (Block_Type.OLIST, _is_ordered_list),
+}
+
+
 # Takes a single block of markdown and returns the type of that block based on its properties.
+# The first character picks the only type the block could be, so at most one check is run on it.
 def block_to_block_type(markdown_block: str) -> Block_Type:
-    blocks = markdown_block.split("\n")
-    if markdown_block.startswith(("# ", "## ", "### ", "#### ", "##### ", "###### ")):
-        return Block_Type.HEADING
-    if len(blocks) > 1 and blocks[0].startswith("```") and blocks[-1].startswith("```"):
-        return Block_Type.CODE
-    if markdown_block.startswith(">"):
-        for line in blocks:
-            if not line.startswith(">"):
-                return Block_Type.PARAGRAPH
-        return Block_Type.QUOTE
-    if markdown_block.startswith("- "):
-        for line in blocks:
-            if not line.startswith("- "):
-                return Block_Type.PARAGRAPH
-        return Block_Type.ULIST
-    if markdown_block.startswith("1. "):
-        i = 1
-        for line in blocks:
-            if not line.startswith(f"{i}. "):
-                return Block_Type.PARAGRAPH
-            i += 1
-        return Block_Type.OLIST
+    block_check = _BLOCK_CHECKS.get(markdown_block[:1])
+    if block_check is not None:
+        block_type, is_block_type = block_check
+        if is_block_type(markdown_block):
+            return block_type
     return Block_Type.PARAGRAPH
 
 
-# Takes a string representing a full markdown document and splits it into a list of strings seperated by a blank line.
+# Takes a string representing a full markdown document and splits it into a list of strings seperated by blank lines.
+# Any number of blank lines in a row counts as a single separator, including lines with only whitespace on them.
+# It walks the lines once, collecting the lines of the current block until a blank line ends it.
+# Lines are split on \n only, since splitlines also splits on characters like form feeds that belong to the text.
+# A \r left at the end of a line by a CRLF file is dropped.
+# Blank lines inside a ``` fence belong to the code, so they only end a block outside of one.
 def markdown_to_blocks(markdown: str) -> list[str]:
-    blocks = markdown.split("\n\n")
-    filtered_blocks: list[str] = []
-    for block in blocks:
-        if block == "":
-            continue
+    blocks: list[str] = []
+    block_lines: list[str] = []
+    in_fence = False
+    for line in markdown.split("\n"):
+        line = line.removesuffix("\r")
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if in_fence or line.strip():
+            block_lines.append(line)
+        elif block_lines:
+            blocks.append("\n".join(block_lines).strip())
+            block_lines = []
+    if block_lines:
+        blocks.append("\n".join(block_lines).strip())
+    return blocks
+
+
+# ================= Block Rendering Functions =======================
+# Each of these takes a single block of markdown of its block type and returns the HTMLNode for it.
+# The general flow is to split the block into lines of text. Then turn those lines of text straight into a list of leaf nodes.
+# Then create a parent node for those leaf nodes.
+
+
+def _render_heading(block: str) -> HTMLNode:
+    heading_count = 0
+    for char in block:
+        if char == "#":
+            heading_count += 1
         else:
-            filtered_blocks.append(block.strip())
-    return filtered_blocks
+            break
+    if heading_count > 6:
+        raise ValueError("Too many pound symbols for a heading")
+    return ParentNode(
+        f"h{heading_count}", text_to_html_nodes(block[heading_count + 1 :])
+    )
+
+
+def _render_code(block: str) -> HTMLNode:
+    code_text = block[4:-3]
+    child_node = _make_leaf(code_text, TextType.TEXT, None)
+    code_node = ParentNode("code", [child_node])
+    return ParentNode("pre", [code_node])
+
+
+def _render_quote(block: str) -> HTMLNode:
+    quote_text = " ".join(line[2:] for line in block.split("\n"))
+    return ParentNode("blockquote", text_to_html_nodes(quote_text))
+
+
+# The list items are built in a single comprehension over the lines of the block, one item per line, instead of
+# appending to a list that has to keep growing.
+def _render_olist(block: str) -> HTMLNode:
+    list_items: list[HTMLNode] = [
+        ParentNode("li", text_to_html_nodes(list_line.split(". ", 1)[1]))
+        for list_line in block.split("\n")
+    ]
+    return ParentNode("ol", list_items)
+
+
+def _render_ulist(block: str) -> HTMLNode:
+    list_items: list[HTMLNode] = [
+        ParentNode("li", text_to_html_nodes(list_line[2:]))
+        for list_line in block.split("\n")
+    ]
+    return ParentNode("ul", list_items)
+
+
+def _render_paragraph(block: str) -> HTMLNode:
+    paragraph_text = block.replace("\n", " ")
+    return ParentNode("p", text_to_html_nodes(paragraph_text))
+
+
+_BLOCK_RENDERERS: dict[Block_Type, Callable[[str], HTMLNode]] = {
+    Block_Type.HEADING: _render_heading,
+    Block_Type.CODE: _render_code,
+    Block_Type.QUOTE: _render_quote,
+    Block_Type.OLIST: _render_olist,
+    Block_Type.ULIST: _render_ulist,
+    Block_Type.PARAGRAPH: _render_paragraph,
+}
 
 
 # Converts a markdown document into a Tree of HTMLNodes. The top of the tree is then returned.
-# It works by splitting the markdown into blocks and then parsing each block type appropriately.
-# The general flow is to split the block into lines of text. Then turn those lines of text into a list of text nodes.
-# Then turn those TextNodes into HTMLNodes. Then create a parent node for those HTMLNodes and at that to a list of block nodes.
-# Finally a Parent node is made for all the parent nodes from the list of block nodes and that's what's returned.
+# It works by splitting the markdown into blocks and then rendering each block with the renderer for its block type.
+# Finally a Parent node is made for all of the block nodes and that's what's returned.
 def markdown_to_html_node(markdown: str) -> HTMLNode:
-    markdown_blocks = markdown_to_blocks(markdown)
-    block_nodes: list[HTMLNode] = []
-    for block in markdown_blocks:
-        current_block_type = block_to_block_type((block))
-
-        if current_block_type == Block_Type.HEADING:
-            heading_count = 0
-            for char in block:
-                if char == "#":
-                    heading_count += 1
-                else:
-                    break
-            if heading_count > 6:
-                raise ValueError("Too many pound symbols for a heading")
-            heading_node = ParentNode(f"h{heading_count}", None)
-            text_nodes = text_to_textnodes(block[heading_count + 1 :])
-            child_nodes: list[HTMLNode] = []
-            for node in text_nodes:
-                child_nodes.append(text_node_to_html_node(node))
-            heading_node.children = child_nodes
-            block_nodes.append(heading_node)
-
-        elif current_block_type == Block_Type.CODE:
-            code_text = block[4:-3]
-            text_node = TextNode(code_text, TextType.TEXT)
-            child_node = text_node_to_html_node(text_node)
-            code_node = ParentNode("code", [child_node])
-            wrapped_code_node = ParentNode("pre", [code_node])
-            block_nodes.append(wrapped_code_node)
-
-        elif current_block_type == Block_Type.QUOTE:
-            lines: list[str] = block.split("\n")
-            quote_text_lines: list[str] = []
-            for line in lines:
-                quote_text_lines.append(line[2:])
-            quote_text = " ".join(quote_text_lines)
-            quote_text_nodes = text_to_textnodes(quote_text)
-            quote_child_nodes: list[HTMLNode] = []
-            for node in quote_text_nodes:
-                quote_child_nodes.append(text_node_to_html_node(node))
-            quote_parent_node = ParentNode("blockquote", quote_child_nodes)
-            block_nodes.append(quote_parent_node)
-
-        elif current_block_type == Block_Type.OLIST:
-            list_lines = block.split("\n")
-            list_items: list[HTMLNode] = []
-            for list_line in list_lines:
-                line_text = list_line.split(". ", 1)
-                line_text_nodes = text_to_textnodes(line_text[1])
-                line_child_nodes: list[HTMLNode] = []
-                for line_text_node in line_text_nodes:
-                    line_child_nodes.append(text_node_to_html_node(line_text_node))
-                list_items.append(ParentNode("li", line_child_nodes))
-            block_nodes.append(ParentNode("ol", list_items))
-
-        elif current_block_type == Block_Type.ULIST:
-            list_lines = block.split("\n")
-            list_items: list[HTMLNode] = []
-            for list_line in list_lines:
-                line_text = list_line[2:]
-                line_text_nodes = text_to_textnodes(line_text)
-                line_child_nodes: list[HTMLNode] = []
-                for line_text_node in line_text_nodes:
-                    line_child_nodes.append(text_node_to_html_node(line_text_node))
-                list_items.append(ParentNode("li", line_child_nodes))
-            block_nodes.append(ParentNode("ul", list_items))
-
-        elif current_block_type == Block_Type.PARAGRAPH:
-            lines = block.split("\n")
-            paragraph_text = " ".join(lines)
-            paragraph_text_nodes = text_to_textnodes(paragraph_text)
-            paragraph_child_nodes: list[HTMLNode] = []
-            for node in paragraph_text_nodes:
-                paragraph_child_nodes.append(text_node_to_html_node(node))
-            paragraph_node = ParentNode("p", paragraph_child_nodes)
-            block_nodes.append(paragraph_node)
-
+    block_nodes = [
+        _BLOCK_RENDERERS[block_to_block_type(block)](block)
+        for block in markdown_to_blocks(markdown)
+    ]
     return ParentNode("div", block_nodes, None)
 
 
+# Matches a line that's an h1 heading with some text and captures that text without the surrounding spaces
+_TITLE_RE = re.compile(r"^# +(\S.*?)[ \t]*$", re.MULTILINE)
+
+
 # Extracts the title of a string of markdown text and returns it as a string.
+# The title is the first h1 heading, found with one search instead of splitting the document into lines.
 def extract_title(markdown_content: str) -> str:
-    markdown_lines = markdown_content.split("\n")
-    for line in markdown_lines:
-        if line.startswith("# "):
-            title = line.strip("# ")
-            return title
-    raise Exception("No Title")
+    title_match = _TITLE_RE.search(markdown_content)
+    if title_match is None:
+        raise ValueError("No Title")
+    return title_match.group(1)
@@ -1,3 +1,7 @@
+import contextlib
+import io
+import os
+import tempfile
 import unittest
 
 from node import (
@@ -10,12 +14,14 @@ from node import (
     split_nodes_delimiter,
     split_image_or_link_nodes,
     text_to_textnodes,
+    text_to_html_nodes,
     Block_Type,
     block_to_block_type,
     markdown_to_blocks,
     markdown_to_html_node,
     extract_title,
 )
+from main import generate_page, generate_pages_recursive
 
 # ================= HTMLNode Test =====================
 
@@ -32,6 +38,15 @@ class TestHTMLNode(unittest.TestCase):
         self.assertEqual(node2.props_to_html(), "")
         self.assertNotEqual(node1.props_to_html(), node2.props_to_html())
 
+    def test_props_escaped(self):
+        node = HTMLNode(
+            "a", "link", None, {"href": "/search?q=a&b", "title": '"it\'s"'}
+        )
+        self.assertEqual(
+            node.props_to_html(),
+            ' href="/search?q=a&amp;b" title="&quot;it&#39;s&quot;"',
+        )
+
     def test_values(self):
         node1: HTMLNode = HTMLNode("div", "I wish I could read")
         self.assertEqual(node1.tag, "div")
@@ -39,6 +54,21 @@ class TestHTMLNode(unittest.TestCase):
         self.assertEqual(node1.children, None)
         self.assertEqual(node1.props, None)
 
+    def test_leaf_fields_read_only(self):
+        node = LeafNode("a", "link", {"href": "/home"})
+        for field, value in (("tag", "b"), ("value", "x"), ("props", None)):
+            with self.assertRaises(AttributeError):
+                setattr(node, field, value)
+        self.assertEqual(node.to_html(), '<a href="/home">link</a>')
+        with self.assertRaises(AttributeError):
+            setattr(ParentNode("p", []), "props", None)
+
+    def test_parent_fields_assignable(self):
+        node = ParentNode("p", [])
+        node.tag = "h2"
+        node.children = [LeafNode(None, "heading")]
+        self.assertEqual(node.to_html(), "<h2>heading</h2>")
+
     def test_leaf_to_html_p(self):
         node1 = LeafNode("p", "Hello, world!")
         self.assertEqual(node1.to_html(), "<p>Hello, world!</p>")
@@ -51,6 +81,9 @@ class TestHTMLNode(unittest.TestCase):
         node1 = LeafNode(None, "Hello, world!")
         self.assertEqual(node1.to_html(), "Hello, world!")
 
+    def test_leaf_no_value(self):
+        self.assertRaises(ValueError, LeafNode, "p", None)
+
     def test_to_html_with_children(self):
         child_node = LeafNode("span", "child")
         parent_node = ParentNode("div", [child_node])
@@ -95,6 +128,42 @@ class TestHTMLNode(unittest.TestCase):
             "<h2><b>Bold text</b>Normal text<i>italic text</i>Normal text</h2>",
         )
 
+    def test_to_html_errors(self):
+        parent_node = ParentNode("div", [ParentNode(None, [LeafNode("b", "text")])])
+        self.assertRaises(ValueError, parent_node.to_html)
+        parent_node = ParentNode("div", [ParentNode("p", None)])
+        self.assertRaises(ValueError, parent_node.to_html)
+
+    def test_to_html_deep_tree(self):
+        node = LeafNode(None, "deep")
+        for _ in range(5000):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<span><span>"))
+        self.assertTrue(html.endswith("deep" + "</span>" * 5000))
+
+    def test_to_html_into_reused_buffer(self):
+        buf: list[str] = []
+        first = ParentNode("p", [LeafNode("b", "one")])
+        second = ParentNode("ul", [ParentNode("li", [LeafNode(None, "two")])])
+        first._to_html_into(buf)
+        self.assertEqual("".join(buf), first.to_html())
+        buf.clear()
+        second._to_html_into(buf)
+        self.assertEqual("".join(buf), "<ul><li>two</li></ul>")
+
+    def test_write_to(self):
+        node = ParentNode(
+            "div",
+            [
+                ParentNode("p", [LeafNode("b", "Bold text"), LeafNode(None, "Normal")]),
+                LeafNode("a", "link", {"href": "/home"}),
+            ],
+        )
+        out = io.StringIO()
+        node.write_to(out)
+        self.assertEqual(out.getvalue(), node.to_html())
+
 
 # =============== TextNode Tests =====================
 
@@ -134,6 +203,33 @@ class TestTextNodeToHTMLNode(unittest.TestCase):
         self.assertEqual(html_node.tag, "b")
         self.assertEqual(html_node.value, "This is bold")
 
+    def test_every_type(self):
+        tags = {
+            TextType.TEXT: None,
+            TextType.BOLD_TEXT: "b",
+            TextType.ITALIC_TEXT: "i",
+            TextType.CODE_TEXT: "code",
+            TextType.LINK_TEXT: "a",
+            TextType.IMAGE_TEXT: "img",
+        }
+        for text_type, tag in tags.items():
+            html_node = text_node_to_html_node(TextNode("text", text_type, "url"))
+            self.assertEqual(html_node.tag, tag)
+
+    def test_link_or_image_without_url(self):
+        for text_type in (TextType.LINK_TEXT, TextType.IMAGE_TEXT):
+            node = TextNode("x", text_type)
+            self.assertRaises(ValueError, text_node_to_html_node, node)
+
+    def test_invalid_type(self):
+        node = TextNode("This is text", "bold")  # pyright: ignore[reportArgumentType]
+        self.assertRaises(ValueError, text_node_to_html_node, node)
+
+    def test_block_type_is_invalid_even_when_cached(self):
+        _ = text_node_to_html_node(TextNode("x", TextType.TEXT))
+        node = TextNode("x", Block_Type.HEADING)  # pyright: ignore[reportArgumentType]
+        self.assertRaises(ValueError, text_node_to_html_node, node)
+
 
 class TestSplitNodes(unittest.TestCase):
     def test_delim_bold(self):
@@ -287,6 +383,25 @@ class Test_Split_Image_Or_Link(unittest.TestCase):
             new_nodes,
         )
 
+    def test_split_images_and_links(self):
+        node = TextNode(
+            "A [link](https://boot.dev) and an ![image](https://i.imgur.com/zjjcJKZ.png)",
+            TextType.TEXT,
+        )
+        new_nodes = split_image_or_link_nodes([node], TextType.IMAGE_TEXT)
+        new_nodes = split_image_or_link_nodes(new_nodes, TextType.LINK_TEXT)
+        self.assertListEqual(
+            [
+                TextNode("A ", TextType.TEXT),
+                TextNode("link", TextType.LINK_TEXT, "https://boot.dev"),
+                TextNode(" and an ", TextType.TEXT),
+                TextNode(
+                    "image", TextType.IMAGE_TEXT, "https://i.imgur.com/zjjcJKZ.png"
+                ),
+            ],
+            new_nodes,
+        )
+
 
 class Test_Text_To_Textnodes(unittest.TestCase):
     def test_all_of_them(self):
@@ -313,6 +428,46 @@ class Test_Text_To_Textnodes(unittest.TestCase):
             output_nodes,
         )
 
+    def test_code_keeps_other_syntax(self):
+        output_nodes = text_to_textnodes("Run `a **b** _c_` then **stop**")
+        self.assertListEqual(
+            [
+                TextNode("Run ", TextType.TEXT),
+                TextNode("a **b** _c_", TextType.CODE_TEXT),
+                TextNode(" then ", TextType.TEXT),
+                TextNode("stop", TextType.BOLD_TEXT),
+            ],
+            output_nodes,
+        )
+
+    def test_bold_across_lines(self):
+        output_nodes = text_to_textnodes("a **b\nc** d")
+        self.assertListEqual(
+            [
+                TextNode("a ", TextType.TEXT),
+                TextNode("b\nc", TextType.BOLD_TEXT),
+                TextNode(" d", TextType.TEXT),
+            ],
+            output_nodes,
+        )
+
+    def test_unclosed_delimiter_is_text(self):
+        output_nodes = text_to_textnodes("a **b")
+        self.assertListEqual([TextNode("a **b", TextType.TEXT)], output_nodes)
+
+
+class Test_Text_To_HTML_Nodes(unittest.TestCase):
+    def test_matches_textnodes(self):
+        text = "This is **text** with an _italic_ word and a [link](https://boot.dev)"
+        html_nodes = text_to_html_nodes(text)
+        self.assertEqual(
+            [node.to_html() for node in html_nodes],
+            [
+                text_node_to_html_node(node).to_html()
+                for node in text_to_textnodes(text)
+            ],
+        )
+
 
 class Test_Block_Ro_Block_Type(unittest.TestCase):
     def test_block_to_block_types(self):
@@ -329,6 +484,18 @@ class Test_Block_Ro_Block_Type(unittest.TestCase):
         block = "paragraph"
         self.assertEqual(block_to_block_type(block), Block_Type.PARAGRAPH)
 
+    def test_block_to_block_types_not_matching(self):
+        block = "####### too many"
+        self.assertEqual(block_to_block_type(block), Block_Type.PARAGRAPH)
+        block = "```\nnot closed"
+        self.assertEqual(block_to_block_type(block), Block_Type.PARAGRAPH)
+        block = "> quote\nnot quote"
+        self.assertEqual(block_to_block_type(block), Block_Type.PARAGRAPH)
+        block = "- list\nnot list"
+        self.assertEqual(block_to_block_type(block), Block_Type.PARAGRAPH)
+        block = "1. list\n3. items"
+        self.assertEqual(block_to_block_type(block), Block_Type.PARAGRAPH)
+
 
 class Test_Markdown_To_Blocks(unittest.TestCase):
     def test_markdown_to_blocks(self):
@@ -374,6 +541,29 @@ This is the same paragraph on a new line
             ],
         )
 
+    def test_markdown_to_blocks_whitespace_lines(self):
+        md = "First paragraph\n   \n\t\nSecond paragraph\n  \n- list"
+        blocks = markdown_to_blocks(md)
+        self.assertEqual(blocks, ["First paragraph", "Second paragraph", "- list"])
+
+    def test_markdown_to_blocks_keeps_indentation(self):
+        md = "```\ndef f():\n    return 1\n```\r\n\r\n  paragraph\r\n"
+        blocks = markdown_to_blocks(md)
+        self.assertEqual(blocks, ["```\ndef f():\n    return 1\n```", "paragraph"])
+
+    def test_markdown_to_blocks_blank_line_in_code(self):
+        md = "```\ndef f():\n    x = 1\n    \n    return x\n```"
+        self.assertEqual(markdown_to_blocks(md), [md])
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><pre><code>def f():\n    x = 1\n    \n    return x\n</code></pre></div>",
+        )
+
+    def test_markdown_to_blocks_only_splits_on_newlines(self):
+        md = "page\x0cbreak same line\n\nnext"
+        blocks = markdown_to_blocks(md)
+        self.assertEqual(blocks, ["page\x0cbreak same line", "next"])
+
 
 class Test_Markdown_To_HTML(unittest.TestCase):
     def test_paragraph(self):
@@ -475,6 +665,143 @@ the **same** even with inline stuff
         )
 
 
+class Test_Extract_Title_From_Markdown(unittest.TestCase):
+    def test_title(self):
+        md = "Some text first\n\n#  The Title \n\n## Subheading\n\n# Second h1"
+        self.assertEqual(extract_title(md), "The Title")
+
+    def test_title_keeps_pound_in_text(self):
+        self.assertEqual(extract_title("# Learning C#"), "Learning C#")
+
+    def test_skips_empty_h1(self):
+        self.assertEqual(extract_title("#    \n# Real"), "Real")
+
+    def test_no_title(self):
+        self.assertRaises(ValueError, extract_title, "## Only an h2\n\ntext")
+
+
+# =============== Page Generation Tests =====================
+
+
+class Test_Generate_Page(unittest.TestCase):
+    template = (
+        '<title>{{ Title }}</title><link href="/index.css">'
+        "<article>{{ Content }}</article>"
+        '<img src="/logo.png">'
+    )
+    markdown = "# Hello\n\n[Back Home](/) ![pic](/images/pic.png)"
+
+    def generate(self, basepath: str) -> str:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            from_path = os.path.join(temp_dir, "index.md")
+            dest_path = os.path.join(temp_dir, "index.html")
+            with open(from_path, "w") as m_file:
+                _ = m_file.write(self.markdown)
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_page(from_path, self.template, dest_path, basepath)
+            with open(dest_path, encoding="utf-8") as html_file:
+                return html_file.read()
+
+    def test_root_basepath(self):
+        self.assertEqual(
+            self.generate("/"),
+            '<title>Hello</title><link href="/index.css"><article><div><h1>Hello</h1>'
+            '<p><a href="/">Back Home</a> <img src="/images/pic.png" alt="pic"></img></p>'
+            '</div></article><img src="/logo.png">',
+        )
+
+    def test_sub_basepath(self):
+        self.assertEqual(
+            self.generate("/x/"),
+            '<title>Hello</title><link href="/x/index.css"><article><div><h1>Hello</h1>'
+            '<p><a href="/x/">Back Home</a> <img src="/x/images/pic.png" alt="pic"></img></p>'
+            '</div></article><img src="/x/logo.png">',
+        )
+
+
+class Test_Page_Cache(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.content_dir = os.path.join(temp_dir.name, "content")
+        self.dest_dir = os.path.join(temp_dir.name, "docs")
+        self.cache_dir = os.path.join(temp_dir.name, "cache")
+        self.template_path = os.path.join(temp_dir.name, "template.html")
+        os.makedirs(self.content_dir)
+        os.makedirs(self.dest_dir)
+        self.write(self.template_path, "<title>{{ Title }}</title>{{ Content }}")
+        self.write(os.path.join(self.content_dir, "index.md"), "# Hello")
+
+    def write(self, path: str, text: str) -> None:
+        with open(path, "w") as file:
+            _ = file.write(text)
+
+    # Builds the site and returns what was printed, which says whether each page was generated or copied
+    def build(self, basepath: str = "/") -> str:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            generate_pages_recursive(
+                self.content_dir,
+                self.template_path,
+                self.dest_dir,
+                basepath,
+                self.cache_dir,
+            )
+        return output.getvalue()
+
+    # The files in the cache across every basepath's directory
+    def cached_files(self) -> list[str]:
+        return [
+            os.path.join(dir_path, file_name)
+            for dir_path, _, file_names in os.walk(self.cache_dir)
+            for file_name in file_names
+        ]
+
+    def page(self) -> str:
+        with open(os.path.join(self.dest_dir, "index.html")) as html_file:
+            return html_file.read()
+
+    def test_miss_then_hit(self):
+        self.assertIn("Generating page", self.build())
+        self.assertEqual(len(self.cached_files()), 1)
+        os.remove(os.path.join(self.dest_dir, "index.html"))
+        self.assertIn("Copying cached page", self.build())
+        self.assertEqual(self.page(), "<title>Hello</title><div><h1>Hello</h1></div>")
+
+    def test_changed_markdown_invalidates(self):
+        _ = self.build()
+        self.write(os.path.join(self.content_dir, "index.md"), "# Changed")
+        self.assertIn("Generating page", self.build())
+        self.assertEqual(
+            self.page(), "<title>Changed</title><div><h1>Changed</h1></div>"
+        )
+        # the entry for the old markdown is pruned
+        self.assertEqual(len(self.cached_files()), 1)
+
+    def test_changed_template_invalidates(self):
+        _ = self.build()
+        self.write(self.template_path, "<h2>{{ Title }}</h2>{{ Content }}")
+        self.assertIn("Generating page", self.build())
+        self.assertEqual(self.page(), "<h2>Hello</h2><div><h1>Hello</h1></div>")
+        self.assertEqual(len(self.cached_files()), 1)
+
+    def test_basepaths_cached_separately(self):
+        _ = self.build("/")
+        _ = self.build("/x/")
+        self.assertEqual(len(self.cached_files()), 2)
+        self.assertIn("Copying cached page", self.build("/"))
+
+    def test_temporary_files_not_pruned(self):
+        _ = self.build()
+        (cache_path,) = self.cached_files()
+        temp_path = f"{cache_path}.123.tmp"
+        self.write(temp_path, "being saved by another build")
+        self.write(os.path.join(self.content_dir, "index.md"), "# Changed")
+        _ = self.build()
+        self.assertFalse(os.path.exists(cache_path))
+        self.assertTrue(os.path.exists(temp_path))
+
+
 # class Test_Extract_Title(unittest.TestCase):
 #     def test_only_title(self):
 #         title = "Hi"